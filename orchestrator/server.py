@@ -21,9 +21,17 @@ from typing import Any, Dict, List, Optional
 import aiohttp
 from aiohttp import WSMsgType, web
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 
 def json_dumps(obj: Any) -> str:
-    """JSON 序列化，無額外空格"""
+    """JSON 序列化，無額外空格（有安裝 orjson 時使用 orjson）"""
+    if orjson is not None:
+        # orjson 預設即為緊湊且不跳脫非 ASCII，輸出與下方 json.dumps 相同
+        return orjson.dumps(obj).decode("utf-8")
     return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
 
 
@@ -259,7 +267,8 @@ async def ws_chat_handler(request: web.Request) -> web.WebSocketResponse:
         if got != expected and bearer != expected:
             raise web.HTTPUnauthorized(text="missing/invalid api_key")
 
-    ws = web.WebSocketResponse(heartbeat=20)
+    # llm_delta 為逐 token 的小訊息，permessage-deflate 只會增加每個 frame 的 CPU 與延遲
+    ws = web.WebSocketResponse(heartbeat=20, compress=False)
     await ws.prepare(request)
 
     client: aiohttp.ClientSession = request.app["client_session"]
@@ -11,10 +11,39 @@ from __future__ import annotations
 
 import logging
 from dataclasses import dataclass
-from typing import List, Optional
+from itertools import islice
+from typing import Optional, Sequence
+
+try:
+    import numba
+    import numpy as np
+except ImportError:
+    numba = None
+    np = None
 
 logger = logging.getLogger(__name__)
 
+# Convergence windows at least this long are scanned by the Numba kernel;
+# shorter windows stay in pure Python where JIT dispatch costs more than it saves.
+NUMBA_MIN_WINDOW = 128
+
+# Set once the missing-numba fallback has been logged; checkers are built per run
+_numba_fallback_warned = False
+
+
+if numba is not None:
+    @numba.njit(cache=True)
+    def _check_convergence_numba(scores, eps, patience):
+        """Return True if the last `patience` scores stay within eps of the one before."""
+        n = scores.shape[0]
+        first = scores[n - patience - 1]
+        for i in range(n - patience, n):
+            if abs(scores[i] - first) > eps:
+                return False
+        return True
+else:
+    _check_convergence_numba = None
+
 
 @dataclass
 class TerminationConfig:
@@ -53,10 +82,22 @@ class TerminationChecker:
         self.pareto_patience = config.pareto_patience
         
         self._termination_reason: Optional[str] = None
+        self._goals_enabled = bool(self.goal_thresholds)
+        self._pareto_enabled = self.pareto_patience > 0
+        self._use_numba = self.convergence_patience + 1 >= NUMBA_MIN_WINDOW
+        if self._use_numba and _check_convergence_numba is None:
+            global _numba_fallback_warned
+            if not _numba_fallback_warned:
+                logger.warning(
+                    "[TerminationChecker] numba not available, "
+                    "falling back to pure-Python convergence check"
+                )
+                _numba_fallback_warned = True
+            self._use_numba = False
         
         logger.info(
-            f"[TerminationChecker] Initialized: max_iters={self.max_iters}, "
-            f"eps={self.convergence_eps}, patience={self.convergence_patience}"
+            "[TerminationChecker] Initialized: max_iters=%s, eps=%s, patience=%s",
+            self.max_iters, self.convergence_eps, self.convergence_patience
         )
     
     def should_stop(self, state) -> bool:
@@ -71,55 +112,66 @@ class TerminationChecker:
         # Condition 1: Maximum iterations reached
         if state.iteration >= self.max_iters:
             self._termination_reason = f"Reached max iterations ({state.iteration}/{self.max_iters})"
-            logger.info(f"[TerminationChecker] STOP: {self._termination_reason}")
+            logger.info("[TerminationChecker] STOP: %s", self._termination_reason)
             return True
         
         # Condition 2: Score converged
         if self._is_converged(state.score_history):
             self._termination_reason = f"Score converged (eps={self.convergence_eps})"
-            logger.info(f"[TerminationChecker] STOP: {self._termination_reason}")
+            logger.info("[TerminationChecker] STOP: %s", self._termination_reason)
             return True
         
         # Condition 3: All goals achieved
-        if self._all_goals_achieved(state):
+        if self._goals_enabled and self._all_goals_achieved(state):
             self._termination_reason = "All goals achieved"
-            logger.info(f"[TerminationChecker] STOP: {self._termination_reason}")
+            logger.info("[TerminationChecker] STOP: %s", self._termination_reason)
             return True
         
         # Condition 4: Pareto front stable
-        if self._pareto_stable(state.pareto_history):
+        if self._pareto_enabled and self._pareto_stable(state.pareto_history):
             self._termination_reason = "Pareto front stable"
-            logger.info(f"[TerminationChecker] STOP: {self._termination_reason}")
+            logger.info("[TerminationChecker] STOP: %s", self._termination_reason)
             return True
         
         logger.debug(
-            f"[TerminationChecker] Continue: iteration={state.iteration}, "
-            f"best_score={state.best_score:.4f}"
+            "[TerminationChecker] Continue: iteration=%d, best_score=%.4f",
+            state.iteration, state.best_score
         )
+        self._termination_reason = None
         return False
     
-    def get_termination_reason(self, state) -> str:
+    def get_termination_reason(self, state=None) -> str:
         """Get the reason for termination.
         
-        Should be called after should_stop() returns True.
+        Should be called after should_stop() returns True; the reason recorded
+        by the last should_stop() call is returned without re-running checks.
+        `state` is accepted for backward compatibility and ignored.
         """
-        if self._termination_reason:
-            return self._termination_reason
-        
-        # Re-check to determine reason
-        self.should_stop(state)
         return self._termination_reason or "Unknown"
     
-    def _is_converged(self, score_history: List[float]) -> bool:
-        """Check if scores have converged."""
-        if len(score_history) < self.convergence_patience + 1:
+    def _is_converged(self, score_history: Sequence[float]) -> bool:
+        """Check if scores have converged.
+        
+        Only the trailing window is read (newest first), so `score_history`
+        may be a list or a bounded deque.
+        """
+        window = self.convergence_patience + 1
+        if len(score_history) < window:
             return False
         
-        recent = score_history[-self.convergence_patience:]
-        first_score = score_history[-(self.convergence_patience + 1)]
+        if self._use_numba:
+            # Reversed back to chronological order as a view, no copy
+            scores = np.fromiter(
+                islice(reversed(score_history), window), dtype=np.float64, count=window
+            )[::-1]
+            return bool(_check_convergence_numba(
+                scores, self.convergence_eps, self.convergence_patience
+            ))
+        
+        first_score = score_history[-window]
         
         # Check if all recent changes are below epsilon
-        for score in recent:
+        for score in islice(reversed(score_history), self.convergence_patience):
             if abs(score - first_score) > self.convergence_eps:
                 return False
         
@@ -149,13 +201,14 @@ class TerminationChecker:
         
         return True
     
-    def _pareto_stable(self, pareto_history: List[int]) -> bool:
+    def _pareto_stable(self, pareto_history: Sequence[int]) -> bool:
         """Check if Pareto front has been stable."""
-        if len(pareto_history) < self.pareto_patience + 1:
+        window = self.pareto_patience + 1
+        if len(pareto_history) < window:
             return False
         
-        recent = pareto_history[-self.pareto_patience:]
-        first_count = pareto_history[-(self.pareto_patience + 1)]
+        first_count = pareto_history[-window]
+        recent = islice(reversed(pareto_history), self.pareto_patience)
         
         # Check if Pareto count unchanged
         return all(count == first_count for count in recent)
@@ -18,6 +18,7 @@ from fastapi.staticfiles import StaticFiles
 
 from saga.config import SagaConfig
 from saga.runner import SagaRunner
+from saga.mode_controller import OperationMode
 from saga.outer_loop import IterationResult, FinalReport, HumanReviewRequest, LogEvent, HumanReviewType
 
 logging.basicConfig(level=logging.INFO)
@@ -33,47 +34,69 @@ class RunState(Enum):
     COMPLETED = "completed"
 
 
+# RunController state bits; combined into a single int so hot-path checks
+# are one bitwise AND instead of Enum comparisons plus a separate stop flag.
+_RUN = 1
+_PAUSE = 2
+_STOP = 4
+_DONE = 8
+
+
 class RunController:
     """Controller for managing run state (pause/stop)."""
     
     def __init__(self):
-        self.state = RunState.IDLE
+        self._state_bits = 0
         self._pause_event = asyncio.Event()
         self._pause_event.set()  # Not paused initially
-        self._stop_requested = False
         self._current_result: Optional[dict] = None
     
+    @property
+    def state(self) -> RunState:
+        """Map the state bits back to a RunState for UI reporting."""
+        bits = self._state_bits
+        if bits & _DONE:
+            return RunState.COMPLETED
+        if bits & _STOP:
+            return RunState.STOPPING
+        if bits & _PAUSE:
+            return RunState.PAUSED
+        if bits & _RUN:
+            return RunState.RUNNING
+        return RunState.IDLE
+    
     def start(self):
-        self.state = RunState.RUNNING
-        self._stop_requested = False
+        self._state_bits = _RUN
         self._pause_event.set()
         self._current_result = None
     
     def pause(self):
-        if self.state == RunState.RUNNING:
-            self.state = RunState.PAUSED
+        if self._state_bits == _RUN:
+            self._state_bits = _RUN | _PAUSE
             self._pause_event.clear()
             return True
         return False
     
     def resume(self):
-        if self.state == RunState.PAUSED:
-            self.state = RunState.RUNNING
+        if self._state_bits == _RUN | _PAUSE:
+            self._state_bits = _RUN
             self._pause_event.set()
             return True
         return False
     
     def stop(self):
-        self._stop_requested = True
-        self.state = RunState.STOPPING
+        self._state_bits |= _STOP
         self._pause_event.set()  # Unblock if paused
         return True
     
     def complete(self):
-        self.state = RunState.COMPLETED
+        self._state_bits |= _DONE
     
     def should_stop(self) -> bool:
-        return self._stop_requested
+        return bool(self._state_bits & _STOP)
+    
+    def is_paused(self) -> bool:
+        return bool(self._state_bits & _PAUSE) and not self._state_bits & _STOP
     
     async def wait_if_paused(self):
         """Wait if the run is paused."""
@@ -137,8 +160,12 @@ async def ws_run(ws: WebSocket):
         controller.start()
         await ws.send_json({"type": "run_started", "run_id": run_id or "pending", "state": controller.state.value})
         
-        # Start listening for control messages in background
-        control_task = asyncio.create_task(_handle_control_messages(ws, controller))
+        # Start listening for control messages in background. Autopilot runs
+        # never pause or stop mid-run, so they skip the control reader.
+        interactive = mode != OperationMode.AUTOPILOT.value
+        control_task = None
+        if interactive:
+            control_task = asyncio.create_task(_handle_control_messages(ws, controller))
         
         # Execute SAGA Runner (Async Iterator)
         async for event in runner.run(
@@ -148,20 +175,21 @@ async def ws_run(ws: WebSocket):
             run_id=run_id,
             config_overrides=config_overrides
         ):
-            # Check if stop requested
-            if controller.should_stop():
-                logger.info(f"Stop requested for run {run_id}")
-                await ws.send_json({
-                    "type": "run_stopped",
-                    "run_id": run_id,
-                    "current_result": controller.get_current_result()
-                })
-                break
-            
-            # Wait if paused
-            if controller.state == RunState.PAUSED:
-                await ws.send_json({"type": "run_paused", "run_id": run_id})
-            await controller.wait_if_paused()
+            if interactive:
+                # Check if stop requested
+                if controller.should_stop():
+                    logger.info(f"Stop requested for run {run_id}")
+                    await ws.send_json({
+                        "type": "run_stopped",
+                        "run_id": run_id,
+                        "current_result": controller.get_current_result()
+                    })
+                    break
+                
+                # Wait if paused
+                if controller.is_paused():
+                    await ws.send_json({"type": "run_paused", "run_id": run_id})
+                await controller.wait_if_paused()
             
             if isinstance(event, IterationResult):
                 # Save current result for potential stop
@@ -240,7 +268,8 @@ async def ws_run(ws: WebSocket):
                     "elapsed_ms": event.elapsed_ms
                 })
         
-        control_task.cancel()
+        if control_task:
+            control_task.cancel()
 
     except Exception as e:
         logger.error(f"WebSocket error: {e}")
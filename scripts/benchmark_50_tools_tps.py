@@ -3,13 +3,29 @@ import os
 import argparse
 import asyncio
 import time
-import json
-import aiohttp
-import statistics
 import random
-import threading
-import subprocess
+import re
 from datetime import datetime
+from functools import lru_cache
+
+from benchmark_common import (
+    LogWriter,
+    SaturationDetector,
+    SystemMonitor,
+    create_session,
+    dumps_bytes,
+    encode_payload,
+    install_event_loop_policy,
+    latency_summary,
+    load_env_file,
+    loads_json,
+    positive_int,
+)
+
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
 
 # Force UTF-8 output for Windows console
 try:
@@ -19,19 +35,6 @@ except:
 
 print("開始執行 50-Tools TPS 基準測試腳本...", flush=True)
 
-
-def load_env_file(filepath):
-    try:
-        with open(filepath, "r") as f:
-            for line in f:
-                line = line.strip()
-                if line and not line.startswith("#"):
-                    key, value = line.split("=", 1)
-                    os.environ[key] = value
-    except:
-        pass
-
-
 load_env_file(".env")
 
 SGLANG_URL = "http://localhost:8082/v1/chat/completions"
@@ -66,11 +69,13 @@ DEVICE_ID_TRANSLATIONS = {
     "motion_sensor_1": "動作感測器",
 }
 
+OUTPUT_TRANSLATIONS = {**LOCATION_TRANSLATIONS, **DEVICE_ID_TRANSLATIONS}
+# Longest keys first so e.g. "air_cleaner_1" wins over "air_cleaner"
+OUTPUT_TRANSLATION_PATTERN = re.compile(
+    "|".join(map(re.escape, sorted(OUTPUT_TRANSLATIONS, key=len, reverse=True)))
+)
 
-def log_print(message, *, end="\n", flush=False):
-    print(message, end=end, flush=flush)
-    with open(LOG_FILE, "a", encoding="utf-8") as f:
-        f.write(message + end)
+log_print = LogWriter(LOG_FILE)
 
 
 def _translate_value(key, value):
@@ -102,58 +107,13 @@ def localize_output(output):
         return output
     stripped = output.strip()
     try:
-        parsed = json.loads(stripped)
+        parsed = loads_json(stripped)
         localized = _localize_obj(parsed)
-        return json.dumps(localized, ensure_ascii=False)
+        return dumps_bytes(localized).decode("utf-8")
     except Exception:
         # Best-effort string replacements for stream/partial outputs.
-        for src, dst in LOCATION_TRANSLATIONS.items():
-            stripped = stripped.replace(src, dst)
-        for src, dst in DEVICE_ID_TRANSLATIONS.items():
-            stripped = stripped.replace(src, dst)
-        return stripped
-
-
-class SystemMonitor:
-    def __init__(self, interval=0.5):
-        self.interval = interval
-        self.running = False
-        self.gpu_stats = []
-        self.vram_stats = []
-        self.thread = None
-
-    def get_gpu_stats(self):
-        try:
-            cmd = "nvidia-smi --query-gpu=utilization.gpu,memory.used --format=csv,noheader,nounits"
-            output = subprocess.check_output(cmd, shell=True).decode("utf-8").strip()
-            util, mem = output.split(",")
-            return float(util), float(mem)
-        except:
-            return 0.0, 0.0
-
-    def _monitor_loop(self):
-        while self.running:
-            gpu_util, gpu_mem = self.get_gpu_stats()
-            self.gpu_stats.append(gpu_util)
-            self.vram_stats.append(gpu_mem)
-            time.sleep(self.interval)
-
-    def start(self):
-        self.running = True
-        self.thread = threading.Thread(target=self._monitor_loop)
-        self.thread.start()
-
-    def stop(self):
-        self.running = False
-        if self.thread:
-            self.thread.join()
-
-    def report(self):
-        if not self.gpu_stats:
-            return "無 GPU 數據。"
-        return (
-            f"    GPU 使用率: 平均 {statistics.mean(self.gpu_stats):.1f}% | 最大 {max(self.gpu_stats):.1f}%\n"
-            f"    GPU 顯存 (VRAM): 平均 {statistics.mean(self.vram_stats):.0f} MB | 最大 {max(self.vram_stats):.0f} MB"
+        return OUTPUT_TRANSLATION_PATTERN.sub(
+            lambda m: OUTPUT_TRANSLATIONS[m.group(0)], stripped
         )
 
 
@@ -253,61 +213,81 @@ def build_tools(count):
 TOOLS = build_tools(TOOL_COUNT)
 
 
+TOOL_NEEDED_PROMPTS = [
+    "請幫我把客廳冷氣調到 24 度並開啟睡眠模式，現在很熱。",
+    "家裡空氣品質不太好，請把空氣清淨機調到強力檔 30 分鐘。",
+    "幫我啟動掃地機器人，清掃客廳與餐廳並避開地毯區。",
+    "晚上 10 點請把客廳燈調到 40% 亮度並切成暖黃光。",
+    "冰箱門好像沒關好，請檢查門的狀態並提醒我。",
+    "請把熱水器設定為 42 度，並開啟節能模式。",
+]
+MULTI_TOOL_PROMPTS = [
+    "我要外出，請開啟客廳燈並調到 30% 亮度，同時拉上客廳窗簾。",
+    "晚上睡覺前，請關閉客廳燈並拉上窗簾，再把電視設定 30 分鐘後自動關閉。",
+    "啟動夜間安全模式：把客廳燈調到 20% 亮度並切成暖黃光，同時關閉窗簾。",
+    "我要出門，請鎖上大門並啟動客廳監視器錄影。",
+    "聽到異常聲響，請開啟警報器並啟動監視器錄影。",
+]
+
+
 def generate_request(idx):
-    tool_needed = [
-        (
-            "請幫我把客廳冷氣調到 24 度並開啟睡眠模式，現在很熱。"
-        ),
-        (
-            "家裡空氣品質不太好，請把空氣清淨機調到強力檔 30 分鐘。"
-        ),
-        (
-            "幫我啟動掃地機器人，清掃客廳與餐廳並避開地毯區。"
-        ),
-        (
-            "晚上 10 點請把客廳燈調到 40% 亮度並切成暖黃光。"
-        ),
-        (
-            "冰箱門好像沒關好，請檢查門的狀態並提醒我。"
-        ),
-        (
-            "請把熱水器設定為 42 度，並開啟節能模式。"
-        ),
-    ]
-    multi_tool_needed = [
-        "我要外出，請開啟客廳燈並調到 30% 亮度，同時拉上客廳窗簾。",
-        "晚上睡覺前，請關閉客廳燈並拉上窗簾，再把電視設定 30 分鐘後自動關閉。",
-        "啟動夜間安全模式：把客廳燈調到 20% 亮度並切成暖黃光，同時關閉窗簾。",
-        "我要出門，請鎖上大門並啟動客廳監視器錄影。",
-        "聽到異常聲響，請開啟警報器並啟動監視器錄影。",
-    ]
     if idx % 5 == 0:
-        return random.choice(multi_tool_needed)
-    return random.choice(tool_needed)
+        return random.choice(MULTI_TOOL_PROMPTS)
+    return random.choice(TOOL_NEEDED_PROMPTS)
+
+
+DEVICE_KEYWORDS = {
+    "ac": ["冷氣", "空調", "冷房", "air conditioner", "ac"],
+    "air_purifier": ["空氣清淨機", "空氣淨化", "air purifier"],
+    "robot_vacuum": ["掃地機器人", "掃地", "robot vacuum"],
+    "lights": ["燈", "燈光", "照明", "lights", "light"],
+    "water_heater": ["熱水器", "water heater"],
+    "fridge": ["冰箱", "fridge", "refrigerator"],
+    "dehumidifier": ["除濕機", "除濕", "dehumidifier"],
+    "humidifier": ["加濕器", "加濕", "humidifier"],
+    "tv": ["電視", "tv", "television"],
+    "curtain": ["窗簾", "curtain", "blind"],
+    "door_lock": ["門鎖", "大門", "lock", "door"],
+    "security_camera": ["監視器", "攝影機", "camera", "security"],
+    "siren": ["警報", "警鈴", "siren", "alarm"],
+    "motion_sensor": ["感測", "偵測", "sensor", "motion"],
+}
 
-def select_tools(prompt, all_tools):
-    keyword_map = {
-        "ac": ["冷氣", "空調", "冷房", "air conditioner", "ac"],
-        "air_purifier": ["空氣清淨機", "空氣淨化", "air purifier"],
-        "robot_vacuum": ["掃地機器人", "掃地", "robot vacuum"],
-        "lights": ["燈", "燈光", "照明", "lights", "light"],
-        "water_heater": ["熱水器", "water heater"],
-        "fridge": ["冰箱", "fridge", "refrigerator"],
-        "dehumidifier": ["除濕機", "除濕", "dehumidifier"],
-        "humidifier": ["加濕器", "加濕", "humidifier"],
-        "tv": ["電視", "tv", "television"],
-        "curtain": ["窗簾", "curtain", "blind"],
-        "door_lock": ["門鎖", "大門", "lock", "door"],
-        "security_camera": ["監視器", "攝影機", "camera", "security"],
-        "siren": ["警報", "警鈴", "siren", "alarm"],
-        "motion_sensor": ["感測", "偵測", "sensor", "motion"],
-    }
-    matched_devices = set()
-    for device, keywords in keyword_map.items():
+
+def _build_keyword_automaton():
+    # One multi-pattern automaton scans a prompt for every keyword in a single pass.
+    if ahocorasick is None:
+        return None
+    automaton = ahocorasick.Automaton()
+    for device, keywords in DEVICE_KEYWORDS.items():
         for keyword in keywords:
-            if keyword in prompt:
-                matched_devices.add(device)
-                break
+            # A keyword shared by several devices maps to all of them
+            if automaton.exists(keyword):
+                automaton.add_word(keyword, automaton.get(keyword) + (device,))
+            else:
+                automaton.add_word(keyword, (device,))
+    automaton.make_automaton()
+    return automaton
+
+
+KEYWORD_AUTOMATON = _build_keyword_automaton()
+
+
+@lru_cache(maxsize=128)
+def match_devices(prompt):
+    if KEYWORD_AUTOMATON is not None:
+        return frozenset(
+            device for _, devices in KEYWORD_AUTOMATON.iter(prompt) for device in devices
+        )
+    return frozenset(
+        device
+        for device, keywords in DEVICE_KEYWORDS.items()
+        if any(keyword in prompt for keyword in keywords)
+    )
+
+
+def select_tools(prompt, all_tools):
+    matched_devices = match_devices(prompt)
     if not matched_devices:
         return all_tools
     filtered = []
@@ -319,97 +299,111 @@ def select_tools(prompt, all_tools):
     return filtered if filtered else all_tools
 
 
-async def make_request(session, req_id, stream):
-    prompt = generate_request(req_id)
-    tools_for_request = select_tools(prompt, TOOLS)
+# Tools JSON per prompt, encoded once instead of on every request.
+PROMPT_TOOLS_JSON = {
+    prompt: dumps_bytes(select_tools(prompt, TOOLS))
+    for prompt in TOOL_NEEDED_PROMPTS + MULTI_TOOL_PROMPTS
+}
+
+
+HEADERS = {"Authorization": f"Bearer {API_KEY}", "Content-Type": "application/json"}
+SYSTEM_MESSAGE = {
+    "role": "system",
+    "content": (
+        "你是智慧家庭助理，請一律使用中文。"
+        "你必須依使用者需求呼叫最合適的工具。"
+        "只能呼叫與裝置與動作相符的工具；若同時需要多個動作，請呼叫多個工具。"
+        "工具參數值（如 location、device_id）請務必使用中文（不要輸出 living_room、door_lock_1 這類英文/代碼）。"
+        "若不需要工具，請用一句簡短中文回答。"
+    ),
+}
+BASE_PAYLOAD = {
+    "model": MODEL_NAME,
+    "tool_choice": "required",
+    "temperature": 0.2,
+    "max_tokens": 80,
+}
+
+
+async def make_request(session, req_id, prompt, stream):
+    tools_json = PROMPT_TOOLS_JSON.get(prompt)
+    if tools_json is None:
+        tools_json = dumps_bytes(select_tools(prompt, TOOLS))
     payload = {
-        "model": MODEL_NAME,
-        "messages": [
-            {
-                "role": "system",
-                "content": (
-                    "你是智慧家庭助理，請一律使用中文。"
-                    "你必須依使用者需求呼叫最合適的工具。"
-                    "只能呼叫與裝置與動作相符的工具；若同時需要多個動作，請呼叫多個工具。"
-                    "工具參數值（如 location、device_id）請務必使用中文（不要輸出 living_room、door_lock_1 這類英文/代碼）。"
-                    "若不需要工具，請用一句簡短中文回答。"
-                ),
-            },
-            {"role": "user", "content": prompt},
-        ],
-        "tools": tools_for_request,
-        "tool_choice": "required",
-        "temperature": 0.2,
+        **BASE_PAYLOAD,
+        "messages": [SYSTEM_MESSAGE, {"role": "user", "content": prompt}],
         "stream": stream,
-        "max_tokens": 80,
     }
 
-    start = time.perf_counter()
+    start = time.perf_counter_ns()
     ttft = None
     output = ""
-    tokens = 0
+    char_count = 0  # tokens estimated as chars // 4 once, at the end
 
     try:
         async with session.post(
-            SGLANG_URL, json=payload, headers={"Authorization": f"Bearer {API_KEY}"}
+            SGLANG_URL,
+            data=encode_payload(payload, tools_json),
+            headers=HEADERS,
         ) as resp:
             if resp.status != 200:
                 error_text = await resp.text()
                 log_print(f"Error: HTTP {resp.status} - {error_text}")
-                return {"ttft": 0, "total": 0, "tokens": 1}
+                return {"ttft_ns": 0, "total_ns": 0, "tokens": 1}
             if stream:
+                # SSE lines stay as bytes; only the JSON payload is parsed
                 async for line in resp.content:
-                    line = line.decode("utf-8").strip()
-                    if not line.startswith("data: "):
+                    if not line.startswith(b"data: "):
                         continue
-                    if line == "data: [DONE]":
+                    if line.rstrip() == b"data: [DONE]":
                         break
                     if ttft is None:
-                        ttft = time.perf_counter()
+                        ttft = time.perf_counter_ns()
                     try:
-                        delta = json.loads(line[6:])["choices"][0]["delta"]
+                        delta = loads_json(line[6:])["choices"][0]["delta"]
                         if "tool_calls" in delta:
                             for tc in delta["tool_calls"]:
                                 if "function" in tc:
                                     args = tc["function"].get("arguments", "")
                                     output += args
-                                    tokens += len(args) / 4
+                                    char_count += len(args)
                         if "content" in delta and delta["content"]:
                             output += delta["content"]
-                            tokens += len(delta["content"]) / 4
+                            char_count += len(delta["content"])
                     except:
                         pass
             else:
-                data = await resp.json()
-                ttft = time.perf_counter()
+                data = loads_json(await resp.read())
+                ttft = time.perf_counter_ns()
                 choice = data.get("choices", [{}])[0]
                 message = choice.get("message", {})
                 content = message.get("content") or ""
                 output += content
-                tokens += len(content) / 4
+                char_count += len(content)
                 tool_calls = message.get("tool_calls") or []
                 for tc in tool_calls:
                     function = tc.get("function", {})
                     args = function.get("arguments", "") or ""
                     output += args
-                    tokens += len(args) / 4
+                    char_count += len(args)
     except Exception as e:
         log_print(f"Error: {e}")
 
-    end = time.perf_counter()
+    end = time.perf_counter_ns()
     display_output = localize_output(output)
     log_print(
         f"[請求 ID: {req_id}]\n輸入: {prompt}\n輸出: {display_output}\n" + "-" * 30,
         flush=True,
     )
     return {
-        "ttft": (ttft - start) if ttft else (end - start),
-        "total": end - start,
-        "tokens": max(1, tokens),
+        "ttft_ns": (ttft - start) if ttft else (end - start),
+        "total_ns": end - start,
+        "tokens": max(1, char_count // 4),
     }
 
 
-async def run(concurrency, total, stream, tps_non_stream):
+async def run(concurrency, total, stream, tps_non_stream, monitor_interval=None, seed=None,
+              saturation_ttft=None, saturation_window=32):
     mode = "stream" if stream else "non-stream"
     tps_mode = "non-stream" if tps_non_stream else mode
     os.makedirs(LOG_DIR, exist_ok=True)
@@ -418,41 +412,65 @@ async def run(concurrency, total, stream, tps_non_stream):
         f"正在執行 {total} 個請求（並發數：{concurrency}），tools={TOOL_COUNT}，mode={mode}, tps_mode={tps_mode}...",
         flush=True,
     )
-    monitor = SystemMonitor()
+    monitor = SystemMonitor(monitor_interval)
     monitor.start()
 
     request_stream = stream
     if tps_non_stream:
         request_stream = False
 
-    sem = asyncio.Semaphore(concurrency)
-    async with aiohttp.ClientSession() as session:
-        tasks = []
-        start_time = time.perf_counter()
+    # Draw every prompt up front so the hot path does no RNG work and a
+    # fixed seed reproduces the same request mix.
+    if seed is not None:
+        random.seed(seed)
+    prompts = [generate_request(i) for i in range(total)]
+
+    async with create_session(concurrency) as session:
+        # Fixed pool of workers draining a queue of request ids: exactly
+        # `concurrency` requests in flight, no O(total) pending coroutines.
+        queue = asyncio.Queue()
         for i in range(total):
-            async def worker(idx):
-                async with sem:
-                    return await make_request(session, idx, request_stream)
-            tasks.append(worker(i))
-        results = await asyncio.gather(*tasks)
-        end_time = time.perf_counter()
-
-    monitor.stop()
+            queue.put_nowait(i)
+        results = []
+        saturation = SaturationDetector(saturation_ttft, saturation_window)
+
+        async def worker():
+            # Once saturation trips, ids still queued are dropped undispatched
+            while not saturation.stop_issuing.is_set():
+                try:
+                    idx = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                result = await make_request(session, idx, prompts[idx], request_stream)
+                results.append(result)
+                saturation.observe(result.get("ttft_ns"), len(results))
+
+        start_time = time.perf_counter_ns()
+        await asyncio.gather(*(worker() for _ in range(min(concurrency, total))))
+        end_time = time.perf_counter_ns()
+
+    await monitor.stop()
     valid = [r for r in results if "error" not in r]
-    duration = end_time - start_time
+    # Timings are integer nanoseconds; convert to seconds only for the report
+    duration = (end_time - start_time) / 1e9
 
     log_print("\n" + "=" * 50)
     log_print(f"測試報告（{TOOL_COUNT} Tools TPS）")
     log_print("=" * 50)
-    log_print(f"平均首字延遲 (TTFT): {statistics.mean(r['ttft'] for r in valid):.4f}s")
-    log_print(f"平均總耗時: {statistics.mean(r['total'] for r in valid):.4f}s")
+    for label, key in (("首字延遲 (TTFT)", "ttft_ns"), ("總耗時", "total_ns")):
+        mean, p50, p95, p99 = latency_summary([r[key] for r in valid])
+        log_print(f"平均{label}: {mean:.4f}s | P50 {p50:.4f}s | P95 {p95:.4f}s | P99 {p99:.4f}s")
     log_print(f"系統吞吐量 (RPS): {len(valid) / duration:.2f} req/s")
     log_print(f"系統生成速度 (TPS): {sum(r['tokens'] for r in valid) / duration:.2f} tokens/s")
+    saturation_note = saturation.report(concurrency, total)
+    if saturation_note:
+        log_print(saturation_note)
     log_print("-" * 50)
     log_print("資源使用監控")
     log_print(monitor.report())
     log_print("=" * 50)
     log_print(f"[{datetime.now().isoformat(timespec='seconds')}] 基準測試結束")
+    log_print.close()
 
 
 if __name__ == "__main__":
@@ -466,6 +484,39 @@ if __name__ == "__main__":
         action="store_true",
         help="Force non-stream mode when measuring TPS, even if stream is enabled.",
     )
+    parser.add_argument(
+        "--monitor-interval",
+        type=float,
+        default=None,
+        help="GPU sampling interval in seconds (default: WS_GPU_POLL_INTERVAL or 2.0).",
+    )
+    parser.add_argument("--seed", type=int, default=None, help="Random seed for the request mix.")
+    parser.add_argument(
+        "--saturation-ttft",
+        type=float,
+        default=None,
+        help="Stop issuing requests once the rolling median TTFT (seconds) exceeds this.",
+    )
+    parser.add_argument(
+        "--saturation-window",
+        type=positive_int,
+        default=32,
+        help="Number of recent requests in the rolling TTFT median.",
+    )
     args = parser.parse_args()
-    asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
-    asyncio.run(run(args.concurrency, args.total, args.stream, args.tps_non_stream))
+    install_event_loop_policy()
+    try:
+        asyncio.run(
+            run(
+                args.concurrency,
+                args.total,
+                args.stream,
+                args.tps_non_stream,
+                args.monitor_interval,
+                args.seed,
+                args.saturation_ttft,
+                args.saturation_window,
+            )
+        )
+    finally:
+        log_print.close()
@@ -0,0 +1,247 @@
+"""Shared helpers for benchmark_final.py and benchmark_50_tools_tps.py."""
+import os
+import sys
+import argparse
+import json
+import asyncio
+import importlib
+from collections import deque
+import statistics
+import subprocess
+
+import aiohttp
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import pynvml
+except ImportError:
+    pynvml = None
+
+
+def load_env_file(filepath):
+    try:
+        with open(filepath, "r") as f:
+            for line in f:
+                line = line.strip()
+                if line and not line.startswith("#"):
+                    key, value = line.split("=", 1)
+                    os.environ[key] = value
+    except:
+        pass
+
+
+def dumps_bytes(obj):
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def loads_json(data):
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def encode_payload(payload, tools_json):
+    """Serialize a non-empty `payload` dict with a pre-encoded `tools` array appended."""
+    return dumps_bytes(payload)[:-1] + b',"tools":' + tools_json + b"}"
+
+
+def latency_summary(values_ns):
+    """Return (mean, p50, p95, p99) in seconds for a non-empty list of nanosecond timings."""
+    if np is not None:
+        arr = np.asarray(values_ns, dtype=np.float64) / 1e9
+        p50, p95, p99 = np.percentile(arr, [50, 95, 99])
+        return float(arr.mean()), float(p50), float(p95), float(p99)
+    values = [v / 1e9 for v in values_ns]
+    if len(values) < 2:
+        return values[0], values[0], values[0], values[0]
+    # "inclusive" matches numpy's default linear interpolation
+    cuts = statistics.quantiles(values, n=100, method="inclusive")
+    return statistics.mean(values), cuts[49], cuts[94], cuts[98]
+
+
+def install_event_loop_policy():
+    """Select the asyncio loop from BENCH_EVENT_LOOP (auto/uvloop/winloop/asyncio); return its name."""
+    choice = os.getenv("BENCH_EVENT_LOOP", "auto").lower()
+    fast_loop = "winloop" if sys.platform == "win32" else "uvloop"
+    if choice in ("auto", fast_loop):
+        try:
+            module = importlib.import_module(fast_loop)
+            asyncio.set_event_loop_policy(module.EventLoopPolicy())
+            return fast_loop
+        except ImportError:
+            if choice != "auto":
+                print(f"BENCH_EVENT_LOOP={choice} 但未安裝，改用 asyncio 預設事件迴圈。", file=sys.stderr)
+    if sys.platform == "win32":
+        asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+        return "selector"
+    return "asyncio"
+
+
+def create_session(concurrency):
+    # Size the pool to the concurrency level so connections are reused, not re-opened
+    connector = aiohttp.TCPConnector(
+        limit=concurrency, limit_per_host=concurrency, keepalive_timeout=75
+    )
+    timeout = aiohttp.ClientTimeout(total=300)
+    return aiohttp.ClientSession(connector=connector, timeout=timeout)
+
+
+def positive_int(value):
+    """argparse type for options that must be an integer >= 1."""
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"必須是 >= 1 的整數：{value}")
+    return number
+
+
+class SaturationDetector:
+    """Trips once the median TTFT of the last `window` requests exceeds `threshold` seconds."""
+
+    def __init__(self, threshold=None, window=32):
+        if window < 1:
+            raise ValueError(f"saturation window must be >= 1, got {window}")
+        self.threshold_ns = None if threshold is None else threshold * 1e9
+        self.recent = deque(maxlen=window)
+        # Workers stop pulling new request ids once this is set
+        self.stop_issuing = asyncio.Event()
+        self.median_ns = None
+        self.completed_at = None
+
+    def observe(self, ttft_ns, completed):
+        if self.threshold_ns is None or self.stop_issuing.is_set() or not ttft_ns:
+            return
+        self.recent.append(ttft_ns)
+        if len(self.recent) < self.recent.maxlen:
+            return
+        median_ns = statistics.median(self.recent)
+        if median_ns > self.threshold_ns:
+            self.median_ns = median_ns
+            self.completed_at = completed
+            self.stop_issuing.set()
+
+    def report(self, concurrency, total):
+        if not self.stop_issuing.is_set():
+            return None
+        return (
+            f"偵測到伺服器飽和（並發數 {concurrency}）：最近 {len(self.recent)} 筆 TTFT 中位數 "
+            f"{self.median_ns / 1e9:.4f}s > 門檻 {self.threshold_ns / 1e9:.4f}s，"
+            f"於完成 {self.completed_at}/{total} 筆後停止送出新請求。"
+        )
+
+
+class LogWriter:
+    """print() that also appends to a log file held open for the whole run."""
+
+    def __init__(self, path):
+        self.path = path
+        self.fp = None
+
+    def __call__(self, message, *, end="\n", flush=False):
+        print(message, end=end, flush=flush)
+        if self.fp is None:
+            self.fp = open(self.path, "a", encoding="utf-8", buffering=64 * 1024)
+        self.fp.write(message + end)
+        if flush:
+            # Per-request records and the run header reach disk right away
+            self.fp.flush()
+
+    def close(self):
+        if self.fp is not None:
+            self.fp.close()
+            self.fp = None
+
+
+MONITOR_MAX_SAMPLES = 100_000
+
+
+class SystemMonitor:
+    def __init__(self, interval=None):
+        if interval is None:
+            interval = float(os.getenv("WS_GPU_POLL_INTERVAL", "2.0"))
+        self.interval = interval
+        self.running = False
+        # Bounded so long runs keep constant memory (~55h of samples at 2s)
+        self.gpu_stats = deque(maxlen=MONITOR_MAX_SAMPLES)
+        self.vram_stats = deque(maxlen=MONITOR_MAX_SAMPLES)
+        self.task = None
+        self.nvml_handle = None
+
+    def get_gpu_stats(self):
+        if self.nvml_handle is not None:
+            try:
+                util = pynvml.nvmlDeviceGetUtilizationRates(self.nvml_handle).gpu
+                mem = pynvml.nvmlDeviceGetMemoryInfo(self.nvml_handle).used / 1024**2
+                return float(util), float(mem)
+            except pynvml.NVMLError:
+                return 0.0, 0.0
+        # Fallback when pynvml is unavailable: one nvidia-smi process per sample
+        try:
+            cmd = "nvidia-smi --query-gpu=utilization.gpu,memory.used --format=csv,noheader,nounits"
+            output = subprocess.check_output(cmd, shell=True).decode("utf-8").strip()
+            util, mem = output.split(",")
+            return float(util), float(mem)
+        except:
+            return 0.0, 0.0
+
+    async def _monitor_loop(self):
+        while self.running:
+            if self.nvml_handle is not None:
+                gpu_util, gpu_mem = self.get_gpu_stats()
+            else:
+                # nvidia-smi blocks for a process spawn; keep it off the event loop
+                gpu_util, gpu_mem = await asyncio.to_thread(self.get_gpu_stats)
+            self.gpu_stats.append(gpu_util)
+            self.vram_stats.append(gpu_mem)
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        """Start sampling as a task on the running event loop."""
+        # Initialize NVML once and keep the device handle for every sample
+        if pynvml is not None:
+            try:
+                pynvml.nvmlInit()
+                self.nvml_handle = pynvml.nvmlDeviceGetHandleByIndex(0)
+            except pynvml.NVMLError:
+                self.nvml_handle = None
+        self.running = True
+        self.task = asyncio.create_task(self._monitor_loop())
+
+    async def stop(self):
+        self.running = False
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        if self.nvml_handle is not None:
+            pynvml.nvmlShutdown()
+            self.nvml_handle = None
+
+    def report(self):
+        if not self.gpu_stats:
+            return "無 GPU 數據。"
+        if np is not None:
+            gpu = np.fromiter(self.gpu_stats, dtype=np.float64, count=len(self.gpu_stats))
+            vram = np.fromiter(self.vram_stats, dtype=np.float64, count=len(self.vram_stats))
+            gpu_mean, gpu_max = gpu.mean(), gpu.max()
+            vram_mean, vram_max = vram.mean(), vram.max()
+        else:
+            gpu_mean, gpu_max = statistics.mean(self.gpu_stats), max(self.gpu_stats)
+            vram_mean, vram_max = statistics.mean(self.vram_stats), max(self.vram_stats)
+        return (
+            f"    GPU 使用率: 平均 {gpu_mean:.1f}% | 最大 {gpu_max:.1f}%\n"
+            f"    GPU 顯存 (VRAM): 平均 {vram_mean:.0f} MB | 最大 {vram_max:.0f} MB"
+        )
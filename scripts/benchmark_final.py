@@ -3,14 +3,22 @@ import os
 import argparse
 import asyncio
 import time
-import json
-import aiohttp
-import statistics
 import random
-import threading
-import subprocess
 from typing import List, Dict, Any
 
+from benchmark_common import (
+    SaturationDetector,
+    SystemMonitor,
+    create_session,
+    dumps_bytes,
+    encode_payload,
+    install_event_loop_policy,
+    latency_summary,
+    load_env_file,
+    loads_json,
+    positive_int,
+)
+
 # Force UTF-8 output for Windows console
 try:
     sys.stdout.reconfigure(encoding='utf-8')
@@ -19,62 +27,12 @@ except:
 
 print("開始執行最終基準測試腳本...", flush=True)
 
-def load_env_file(filepath):
-    try:
-        with open(filepath, 'r') as f:
-            for line in f:
-                line = line.strip()
-                if line and not line.startswith('#'):
-                    key, value = line.split('=', 1)
-                    os.environ[key] = value
-    except:
-        pass
-
 load_env_file('.env')
 
 SGLANG_URL = "http://localhost:8082/v1/chat/completions"
 API_KEY = os.getenv("SGLANG_API_KEY", "your-secure-api-key-here")
 MODEL_NAME = os.getenv("SGLANG_MODEL") or os.getenv("MODEL_NAME") or "google/translategemma-4b-it"
 
-class SystemMonitor:
-    def __init__(self, interval=0.5):
-        self.interval = interval
-        self.running = False
-        self.gpu_stats = []
-        self.vram_stats = []
-        self.thread = None
-
-    def get_gpu_stats(self):
-        try:
-            cmd = "nvidia-smi --query-gpu=utilization.gpu,memory.used --format=csv,noheader,nounits"
-            output = subprocess.check_output(cmd, shell=True).decode('utf-8').strip()
-            util, mem = output.split(',')
-            return float(util), float(mem)
-        except:
-            return 0.0, 0.0
-
-    def _monitor_loop(self):
-        while self.running:
-            gpu_util, gpu_mem = self.get_gpu_stats()
-            self.gpu_stats.append(gpu_util)
-            self.vram_stats.append(gpu_mem)
-            time.sleep(self.interval)
-
-    def start(self):
-        self.running = True
-        self.thread = threading.Thread(target=self._monitor_loop)
-        self.thread.start()
-
-    def stop(self):
-        self.running = False
-        if self.thread:
-            self.thread.join()
-
-    def report(self):
-        if not self.gpu_stats: return "無 GPU 數據。"
-        return (f"    GPU 使用率: 平均 {statistics.mean(self.gpu_stats):.1f}% | 最大 {max(self.gpu_stats):.1f}%\n"
-                f"    GPU 顯存 (VRAM): 平均 {statistics.mean(self.vram_stats):.0f} MB | 最大 {max(self.vram_stats):.0f} MB")
-
 TOOLS = [
     {
         "type": "function",
@@ -115,6 +73,9 @@ TOOLS = [
     }
 ]
 
+# Tools JSON is identical for every request; encode it once.
+TOOLS_JSON = dumps_bytes(TOOLS)
+
 def generate_request(idx):
     scenarios = [
         (f"請處理訂單 #{idx}：客戶 VIP-123，品項為筆電 2 台、滑鼠 1 個。", "process_ecommerce_order"),
@@ -122,85 +83,103 @@ def generate_request(idx):
     ]
     return random.choice(scenarios)
 
-async def make_request(session, req_id):
-    prompt, _ = generate_request(req_id)
-    payload = {
-        "model": MODEL_NAME,
-        "messages": [
-            {
-                "role": "system",
-                "content": (
-                    "你是助理。請一律使用中文回覆。"
-                    "當需要呼叫工具時，優先以 tool_calls 產生結構化參數，避免輸出多餘文字。"
-                ),
-            },
-            {"role": "user", "content": prompt},
-        ],
-        "tools": TOOLS,
-        "stream": True
-    }
+HEADERS = {"Authorization": f"Bearer {API_KEY}", "Content-Type": "application/json"}
+SYSTEM_MESSAGE = {
+    "role": "system",
+    "content": (
+        "你是助理。請一律使用中文回覆。"
+        "當需要呼叫工具時，優先以 tool_calls 產生結構化參數，避免輸出多餘文字。"
+    ),
+}
+BASE_PAYLOAD = {"model": MODEL_NAME, "stream": True}
+
+async def make_request(session, req_id, prompt):
+    payload = {**BASE_PAYLOAD, "messages": [SYSTEM_MESSAGE, {"role": "user", "content": prompt}]}
     
-    start = time.perf_counter()
+    start = time.perf_counter_ns()
     ttft = None
     output = ""
-    tokens = 0
+    char_count = 0  # tokens estimated as chars // 4 once, at the end
     
     try:
-        async with session.post(SGLANG_URL, json=payload, headers={"Authorization": f"Bearer {API_KEY}"}) as resp:
+        async with session.post(SGLANG_URL, data=encode_payload(payload, TOOLS_JSON), headers=HEADERS) as resp:
             while True:
                 line = await resp.content.readline()
                 if not line:
                     break
-                line = line.decode('utf-8').strip()
-                if line.startswith("data: ") and line != "data: [DONE]":
-                    if ttft is None: ttft = time.perf_counter()
+                # SSE lines stay as bytes; only the JSON payload is parsed
+                if line.startswith(b"data: ") and line.rstrip() != b"data: [DONE]":
+                    if ttft is None: ttft = time.perf_counter_ns()
                     try:
-                        delta = json.loads(line[6:])["choices"][0]["delta"]
+                        delta = loads_json(line[6:])["choices"][0]["delta"]
                         if delta.get("tool_calls"):
                             for tc in delta["tool_calls"]:
                                 if "function" in tc:
                                     args = tc["function"].get("arguments", "")
                                     output += args
-                                    tokens += len(args) / 4
+                                    char_count += len(args)
                         if "content" in delta and delta["content"]:
                             output += delta["content"]
-                            tokens += len(delta["content"]) / 4
+                            char_count += len(delta["content"])
                     except Exception as e:
                         print(f"JSON Parse Error: {e} | Delta: {delta} | Line: {line[:50]}...", file=sys.stderr)
     except Exception as e:
         print(f"Error: {e}")
         
-    end = time.perf_counter()
+    end = time.perf_counter_ns()
     print(f"[請求 ID: {req_id}]\n輸入: {prompt}\n輸出: {output}\n" + "-"*30, flush=True)
-    return {"ttft": (ttft-start) if ttft else (end-start), "total": end-start, "tokens": max(1, tokens)}
+    return {"ttft_ns": (ttft-start) if ttft else (end-start), "total_ns": end-start, "tokens": max(1, char_count // 4)}
 
-async def run(concurrency, total):
+async def run(concurrency, total, monitor_interval=None, seed=None,
+              saturation_ttft=None, saturation_window=32):
     print(f"正在執行 {total} 個請求（並發數：{concurrency}）...", flush=True)
-    monitor = SystemMonitor()
+    monitor = SystemMonitor(monitor_interval)
     monitor.start()
     
-    sem = asyncio.Semaphore(concurrency)
-    async with aiohttp.ClientSession() as session:
-        tasks = []
-        start_time = time.perf_counter()
+    # Draw every prompt up front so the hot path does no RNG work and a
+    # fixed seed reproduces the same request mix.
+    if seed is not None:
+        random.seed(seed)
+    prompts = [generate_request(i)[0] for i in range(total)]
+
+    async with create_session(concurrency) as session:
+        # Fixed pool of workers draining a queue of request ids: exactly
+        # `concurrency` requests in flight, no O(total) pending coroutines.
+        queue = asyncio.Queue()
         for i in range(total):
-            async def worker(idx):
-                async with sem: return await make_request(session, idx)
-            tasks.append(worker(i))
-        results = await asyncio.gather(*tasks)
-        end_time = time.perf_counter()
+            queue.put_nowait(i)
+        results = []
+        saturation = SaturationDetector(saturation_ttft, saturation_window)
+        async def worker():
+            # Once saturation trips, ids still queued are dropped undispatched
+            while not saturation.stop_issuing.is_set():
+                try:
+                    idx = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                result = await make_request(session, idx, prompts[idx])
+                results.append(result)
+                saturation.observe(result.get("ttft_ns"), len(results))
+        start_time = time.perf_counter_ns()
+        await asyncio.gather(*(worker() for _ in range(min(concurrency, total))))
+        end_time = time.perf_counter_ns()
     
-    monitor.stop()
+    await monitor.stop()
     valid = [r for r in results if "error" not in r]
-    duration = end_time - start_time
+    # Timings are integer nanoseconds; convert to seconds only for the report
+    duration = (end_time - start_time) / 1e9
     
     print("\n" + "="*50)
     print("測試報告")
     print("="*50)
-    print(f"平均首字延遲 (TTFT): {statistics.mean(r['ttft'] for r in valid):.4f}s")
-    print(f"平均總耗時: {statistics.mean(r['total'] for r in valid):.4f}s")
+    for label, key in (("首字延遲 (TTFT)", "ttft_ns"), ("總耗時", "total_ns")):
+        mean, p50, p95, p99 = latency_summary([r[key] for r in valid])
+        print(f"平均{label}: {mean:.4f}s | P50 {p50:.4f}s | P95 {p95:.4f}s | P99 {p99:.4f}s")
     print(f"系統吞吐量 (RPS): {len(valid)/duration:.2f} req/s")
     print(f"系統生成速度 (TPS): {sum(r['tokens'] for r in valid)/duration:.2f} tokens/s")
+    saturation_note = saturation.report(concurrency, total)
+    if saturation_note:
+        print(saturation_note)
     print("-"*50)
     print("資源使用監控")
     print(monitor.report())
@@ -210,6 +189,26 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--concurrency", type=int, default=10)
     parser.add_argument("--total", type=int, default=20)
+    parser.add_argument(
+        "--monitor-interval",
+        type=float,
+        default=None,
+        help="GPU sampling interval in seconds (default: WS_GPU_POLL_INTERVAL or 2.0).",
+    )
+    parser.add_argument("--seed", type=int, default=None, help="Random seed for the request mix.")
+    parser.add_argument(
+        "--saturation-ttft",
+        type=float,
+        default=None,
+        help="Stop issuing requests once the rolling median TTFT (seconds) exceeds this.",
+    )
+    parser.add_argument(
+        "--saturation-window",
+        type=positive_int,
+        default=32,
+        help="Number of recent requests in the rolling TTFT median.",
+    )
     args = parser.parse_args()
-    asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
-    asyncio.run(run(args.concurrency, args.total))
+    install_event_loop_policy()
+    asyncio.run(run(args.concurrency, args.total, args.monitor_interval, args.seed,
+                    args.saturation_ttft, args.saturation_window))
@@ -388,6 +388,17 @@ class WsTtsSessionRunner:
             self.metrics.missing_units = sent - received
 
 
+def unit_latency_ms_percentiles(latencies_s: List[float]) -> Dict[str, Optional[float]]:
+    if not latencies_s:
+        return {"unit_latency_ms_p50": None, "unit_latency_ms_p95": None}
+    # Sort once and read both percentiles from the same list
+    ordered = sorted(latencies_s)
+    return {
+        "unit_latency_ms_p50": percentile(ordered, 50) * 1000,
+        "unit_latency_ms_p95": percentile(ordered, 95) * 1000,
+    }
+
+
 def summarize(all_metrics: List[SessionMetrics], duration_s: float) -> str:
     sessions = len(all_metrics)
     errors = sum(1 for m in all_metrics if m.errors)
@@ -503,12 +514,7 @@ async def run_benchmark(args: argparse.Namespace) -> int:
                     "duplicate_units": m.duplicate_units,
                     "mismatched_units": m.mismatched_units,
                     "ttfa_s": m.ttfa_s,
-                    "unit_latency_ms_p50": percentile(sorted(m.unit_latencies_s), 50) * 1000
-                    if m.unit_latencies_s
-                    else None,
-                    "unit_latency_ms_p95": percentile(sorted(m.unit_latencies_s), 95) * 1000
-                    if m.unit_latencies_s
-                    else None,
+                    **unit_latency_ms_percentiles(m.unit_latencies_s),
                     "errors": m.errors,
                 }
                 for m in results
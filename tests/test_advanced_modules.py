@@ -78,6 +78,7 @@ class TestTerminationChecker:
             best_score = 0.7
         
         assert checker.should_stop(MockState()) is False
+        assert checker.get_termination_reason() == "Unknown"
     
     def test_convergence_detection(self):
         config = TerminationConfig(max_iters=100, convergence_eps=0.01, convergence_patience=3)
@@ -92,6 +93,70 @@ class TestTerminationChecker:
         # Should detect convergence
         assert checker._is_converged(MockState().score_history) is True
 
+    def test_convergence_detection_long_window(self):
+        config = TerminationConfig(max_iters=1000, convergence_eps=0.01, convergence_patience=200)
+        checker = TerminationChecker(config)
+
+        history = [0.1 * i for i in range(50)] + [0.9] * 201
+        assert checker._is_converged(history) is True
+        assert checker._is_converged(history[:-1] + [0.95]) is False
+
+    def test_convergence_detection_numba_kernel(self):
+        pytest.importorskip("numba")
+        config = TerminationConfig(max_iters=1000, convergence_eps=0.01, convergence_patience=200)
+        checker = TerminationChecker(config)
+        assert checker._use_numba is True
+
+        history = [0.1 * i for i in range(50)] + [0.9] * 201
+        assert checker._is_converged(history) is True
+        assert checker._is_converged(history[:-1] + [0.95]) is False
+        assert checker._is_converged(history[:100] + [0.9] * 150) is False
+
+    def test_numba_fallback_warns_once(self, monkeypatch, caplog):
+        import saga.termination as termination
+
+        monkeypatch.setattr(termination, "_check_convergence_numba", None)
+        monkeypatch.setattr(termination, "_numba_fallback_warned", False)
+        config = TerminationConfig(convergence_patience=200)
+        with caplog.at_level("WARNING", logger="saga.termination"):
+            checkers = [TerminationChecker(config) for _ in range(3)]
+
+        assert all(c._use_numba is False for c in checkers)
+        assert sum("numba not available" in r.getMessage() for r in caplog.records) == 1
+
+    def test_checks_accept_bounded_deque_history(self):
+        from collections import deque
+
+        config = TerminationConfig(convergence_eps=0.01, convergence_patience=3, pareto_patience=2)
+        checker = TerminationChecker(config)
+
+        scores = deque([0.1, 0.5, 0.7, 0.7, 0.7, 0.7], maxlen=4)
+        pareto = deque([1, 3, 3, 3], maxlen=4)
+        assert checker._is_converged(scores) is True
+        assert checker._pareto_stable(pareto) is True
+        pareto.append(4)
+        assert checker._pareto_stable(pareto) is False
+
+    def test_goals_and_pareto_checks_skipped_when_disabled(self):
+        config = TerminationConfig(max_iters=10, pareto_patience=0)
+        checker = TerminationChecker(config)
+
+        class Report:
+            goal_achievement = {"quality": 1.0}
+
+        class MockState:
+            iteration = 3
+            score_history = [0.1, 0.5, 0.9]
+            pareto_history = [2, 2, 2, 2]
+            analysis_reports = [Report()]
+            best_score = 0.9
+
+        assert checker.should_stop(MockState()) is False
+
+        checker = TerminationChecker(TerminationConfig(max_iters=10, goal_thresholds={"quality": 0.8}))
+        assert checker.should_stop(MockState()) is True
+        assert checker.get_termination_reason(MockState()) == "All goals achieved"
+
 
 class TestEvoGenerator:
     """Tests for EvoGenerator."""